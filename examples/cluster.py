@@ -0,0 +1,78 @@
+"""Cluster example.
+
+Demonstrates consuming streams and sharded PubSub channels spread across the
+nodes of a Redis Cluster.
+
+This demo requires a local cluster. Using `redis-server` binaries (>= 7.0) run
+    for p in 7000 7001 7002; do
+        redis-server --port $p --cluster-enabled yes --save "" \\
+            --appendonly no --cluster-config-file nodes-$p.conf --daemonize yes
+    done
+    redis-cli --cluster create 127.0.0.1:7000 127.0.0.1:7001 127.0.0.1:7002 \\
+        --cluster-yes
+
+"""
+
+import logging
+import time
+
+from redis.cluster import RedisCluster
+
+import rxredis as rxr
+
+from . import utils
+
+_logger = logging.getLogger("rxredis")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    redis_api = RedisCluster.from_url("redis://localhost:7000/0?decode_responses=True")
+    redis_api.flushall()
+
+    # Streams with distinct names land on different slots/nodes, streams sharing
+    # a hash tag on the same slot.
+    streams = ["a", "b", "c", "{d}.x", "{d}.y"]
+    for node in redis_api.get_primaries():
+        print(
+            node.name,
+            [s for s in streams if redis_api.get_node_from_key(s).name == node.name],
+        )
+
+    try:
+        # One read loop per node, merged into a single sequence. Reads start at
+        # the last entry available upon subscription ('$').
+        rxr.from_streams(
+            redis_api,
+            streams,
+            timeout=2.0,
+            complete_on_timeout=True,
+        ).subscribe(
+            on_next=lambda x: _logger.info(f"Consumed {x}"),
+            on_error=lambda _: _logger.exception("consumer"),
+            on_completed=lambda: _logger.info("Streams done"),
+        )
+
+        # Async production to all streams
+        for s in streams:
+            utils.marble_stream_producer(redis_api, stream=s).subscribe()
+
+        # Sharded PubSub, one listen loop per node
+        channels = ["ch1", "ch2", "ch3"]
+        sub = rxr.on_spublish(redis_api, channels).subscribe(
+            on_next=lambda x: _logger.info(f"Received {x}"),
+            on_error=lambda _: _logger.exception("pubsub"),
+        )
+        time.sleep(0.5)
+        for c in channels:
+            redis_api.spublish(c, f"hello {c}")
+        time.sleep(2.0)
+        sub.dispose()
+
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Tracing example.
+
+Demonstrates measuring the end-to-end latency of a two-hop pipeline
+prod -> doubled -> shifted. The trace context written by `to_stream` keeps the
+origin time of each element across hops.
+"""
+
+import logging
+import time
+
+import reactivex.operators as ops
+import redis
+from reactivex.scheduler import NewThreadScheduler
+from redis import Redis
+
+import rxredis as rxr
+
+from . import utils
+
+_logger = logging.getLogger("rxredis")
+
+
+def hop(
+    redis_api: Redis, src: str, dst: str, fn, tracker: rxr.tracing.LatencyTracker
+):
+    return rxr.from_stream(
+        redis_api, stream=src, stream_id="0", timeout=2.0, complete_on_timeout=True
+    ).pipe(
+        rxr.operators.trace(tracker, f"{src}.read"),
+        ops.map(lambda x: (x[0], {**x[1], "marble": fn(int(x[1]["marble"]))})),
+        rxr.operators.trace(tracker, f"{src}.transform"),
+        rxr.operators.to_stream(
+            redis_api, dst, tracker=tracker, trace_stage=f"{dst}.write"
+        ),
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    redis_api: Redis = redis.from_url("redis://localhost:6379/0?decode_responses=True")
+    redis_api.flushall()
+
+    tracker = rxr.tracing.LatencyTracker(window=100)
+
+    try:
+        # Async production to xstream: prod
+        utils.marble_stream_producer(redis_api, stream="prod").subscribe()
+
+        # Each hop reads from its own thread
+        for src, dst, fn in [
+            ("prod", "doubled", lambda v: 2 * v),
+            ("doubled", "shifted", lambda v: v + 1),
+        ]:
+            hop(redis_api, src, dst, fn, tracker).subscribe(
+                on_error=lambda _: _logger.exception("hop"),
+                scheduler=NewThreadScheduler(),
+            )
+
+        time.sleep(5.0)
+        for stage, stats in tracker.summary().items():
+            _logger.info(f"{stage}: {stats}")
+
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -2,3 +2,4 @@
 from .observables import *
 from . import operators
 from . import utils
+from . import tracing
@@ -1,19 +1,291 @@
-from typing import Any, Optional, Tuple, Union
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Optional, Tuple, Union
 
 import redis
 from reactivex import Observable, abc
-from reactivex.disposable import CompositeDisposable, Disposable
-from reactivex.scheduler import CurrentThreadScheduler
+from reactivex.disposable import Disposable
+from reactivex.scheduler import CurrentThreadScheduler, NewThreadScheduler
 from reactivex import operators as ops
 from redis import Redis
+from redis.client import PubSub
+from redis.cluster import RedisCluster
 
 StreamData = dict
 StreamDataWithId = Tuple[str, dict]
+NamedStreamDataWithId = Tuple[str, StreamDataWithId]
 PubSubDataWithId = Tuple[str, dict]
 
+_NodeLoop = Callable[[Redis, list[str], Callable[[], bool], Callable], None]
+
+
+class _SlotMigratedError(redis.exceptions.ClusterError):
+    """Raised when a node unsubscribes a shard channel due to slot migration."""
+
+
+# Errors signalling that the slot layout of a cluster has changed
+_TOPOLOGY_ERRORS = (
+    redis.exceptions.AskError,  # includes MOVED
+    redis.exceptions.TryAgainError,
+    redis.exceptions.ClusterDownError,
+    redis.exceptions.ConnectionError,
+    _SlotMigratedError,
+)
+
+# Delay in seconds before restarting loops on a changed cluster slot layout
+_RESTART_DELAY = 0.1
+
+
+def _group_by_node(
+    redis_api: RedisCluster, keys: list[str]
+) -> list[Tuple[Redis, list[str]]]:
+    """Groups keys by the client of the cluster node serving their hash slot."""
+    groups: dict[str, list[str]] = defaultdict(list)
+    for k in keys:
+        groups[redis_api.get_node_from_key(k).name].append(k)
+    return [
+        (redis_api.get_redis_connection(redis_api.get_node(node_name=name)), group)
+        for name, group in groups.items()
+    ]
+
+
+class _NodeLoops:
+    """Runs one loop per node serving a set of keys and merges their output.
+
+    Emissions of all loops to the observer are serialized. When `sharded` is
+    true and a loop on a Redis Cluster raises one of `_TOPOLOGY_ERRORS`, the
+    slot map is refreshed and all loops are restarted on keys regrouped by node.
+    Loops of the previous layout are not allowed to emit anymore, so no element
+    is emitted twice. Otherwise all keys are handled by a single loop on
+    `redis_api` itself.
+
+    Params:
+        redis_api: Redis or RedisCluster client
+        keys: Keys (streams or channels) to be handled
+        node_loop: Function `(client, keys, active, emit)` handling keys on client
+            while `active()` is true. Emissions must be wrapped in a callable and
+            passed to `emit`. Returns to signal completion.
+        sharded: When true, keys of a cluster are grouped by node.
+        observer: Observer to emit to
+        scheduler: Scheduler to schedule the loops on
+    """
+
+    def __init__(
+        self,
+        redis_api: Union[Redis, RedisCluster],
+        keys: list[str],
+        node_loop: _NodeLoop,
+        sharded: bool,
+        observer: abc.ObserverBase,
+        scheduler: abc.SchedulerBase,
+    ) -> None:
+        self.redis_api = redis_api
+        self.keys = keys
+        self.node_loop = node_loop
+        self.cluster = sharded and isinstance(redis_api, RedisCluster)
+        self.observer = observer
+        self.scheduler = scheduler
+        self.disposed = False
+        self._generation = 0
+        self._pending = 0
+        self._lock = threading.RLock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.disposed:
+                return
+            if len(self.keys) == 0:
+                # Nothing to read from
+                self.disposed = True
+                self.observer.on_completed()
+                return
+            if self.cluster:
+                groups = _group_by_node(self.redis_api, self.keys)
+            else:
+                groups = [(self.redis_api, self.keys)]
+            generation = self._generation
+            self._pending = len(groups)
+
+        for client, keys in groups:
+            self.scheduler.schedule(self._make_action(generation, client, keys))
+
+    def dispose(self) -> None:
+        with self._lock:
+            self.disposed = True
+
+    def _active(self, generation: int) -> bool:
+        return not self.disposed and generation == self._generation
+
+    def _emit(self, generation: int, fn: Callable[[], None]) -> bool:
+        with self._lock:
+            if not self._active(generation):
+                return False
+            fn()
+            return True
+
+    def _fail(self, generation: int, error: Exception) -> None:
+        with self._lock:
+            if self._active(generation):
+                self.disposed = True
+                self.observer.on_error(error)
+
+    def _make_action(self, generation: int, client: Redis, keys: list[str]):
+        def action(_: abc.SchedulerBase, __: Any = None) -> None:
+            self._run(generation, client, keys)
+
+        return action
+
+    def _run(self, generation: int, client: Redis, keys: list[str]) -> None:
+        try:
+            self.node_loop(
+                client,
+                keys,
+                lambda: self._active(generation),
+                lambda fn: self._emit(generation, fn),
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            if not (self.cluster and isinstance(error, _TOPOLOGY_ERRORS)):
+                # Handle error
+                self._fail(generation, error)
+                return
+            with self._lock:
+                if not self._active(generation):
+                    return
+                # Invalidate loops of the current layout
+                self._generation += 1
+                generation = self._generation
+            try:
+                time.sleep(_RESTART_DELAY)
+                self.redis_api.nodes_manager.initialize()
+                self.start()
+            except Exception as refresh_error:  # pylint: disable=broad-except
+                self._fail(generation, refresh_error)
+            return
+
+        # Handle completion, once all loops have completed
+        with self._lock:
+            if self._active(generation):
+                self._pending -= 1
+                if self._pending == 0:
+                    self.disposed = True
+                    self.observer.on_completed()
+
+
+def _last_entry_id(redis_api: Union[Redis, RedisCluster], stream: str) -> str:
+    """Returns the id of the last entry of stream or '0-0' if not available."""
+    try:
+        resp = redis_api.xinfo_stream(stream)
+    except redis.ResponseError:
+        # Stream not available
+        return "0-0"
+    entry = resp["last-entry"]
+    return "0-0" if entry is None else entry[0]
+
+
+def _read_streams(
+    redis_api: Union[Redis, RedisCluster],
+    streams: dict[str, str],
+    batch: int,
+    timeout: float,
+    complete_on_timeout: bool,
+    latest: bool,
+    poll_interval: float,
+    scheduler: Optional[abc.SchedulerBase],
+) -> Observable[NamedStreamDataWithId]:
+    """Reads streams with one XREAD loop per node.
+
+    XREAD rejects keys of different hash slots. A node serving streams of a
+    single slot blocks on one XREAD, a node serving multiple slots polls one
+    XREAD per slot in a single pipelined round trip and backs off exponentially
+    up to `poll_interval` while no data is available.
+    """
+
+    def subscribe(
+        observer: abc.ObserverBase[NamedStreamDataWithId],
+        scheduler_: Optional[abc.SchedulerBase] = None,
+    ) -> abc.DisposableBase:
+        cluster = isinstance(redis_api, RedisCluster)
+        _scheduler = (
+            scheduler
+            or scheduler_
+            or (NewThreadScheduler() if cluster else CurrentThreadScheduler.singleton())
+        )
+
+        # Handle start with next entry after join (best-effort). '$' is resolved
+        # as well, since it cannot be used with non-blocking reads nor across
+        # restarts of read loops.
+        sids = {
+            s: (_last_entry_id(redis_api, s) if sid in ("$", ">") else sid)
+            for s, sid in streams.items()
+        }
+
+        def on_data(resp: list) -> None:
+            for s, entries in resp:
+                if isinstance(s, bytes):
+                    s = s.decode()
+                if latest:
+                    entries = entries[-1:]  # latest item only
+                for rid, value in entries:
+                    observer.on_next((s, (rid, value)))
+
+                # Update last seen
+                if len(entries) > 0:
+                    sids[s] = entries[-1][0]
+
+        def node_loop(
+            client: Redis,
+            keys: list[str],
+            active: Callable[[], bool],
+            emit: Callable,
+        ) -> None:
+            slots: dict[int, list[str]] = defaultdict(list)
+            for s in keys:
+                slots[redis_api.keyslot(s) if cluster else 0].append(s)
+            groups = list(slots.values())
+
+            idle_since = time.monotonic()
+            backoff = 0.0
+            while active():
+                if len(groups) == 1:
+                    resp = client.xread(
+                        {s: sids[s] for s in groups[0]},
+                        count=batch,
+                        block=int(timeout * 1e3),
+                    )
+                else:
+                    pipe = client.pipeline(transaction=False)
+                    for group in groups:
+                        pipe.xread({s: sids[s] for s in group}, count=batch)
+                    resp = [r for rs in pipe.execute() for r in rs]
+
+                if len(resp) > 0:
+                    # Handle data
+                    emit(lambda: on_data(resp))
+                    idle_since = time.monotonic()
+                    backoff = 0.0
+                    continue
+
+                # Handle timeout behavior
+                if complete_on_timeout and (
+                    len(groups) == 1 or time.monotonic() - idle_since >= timeout
+                ):
+                    return
+                if len(groups) > 1:
+                    backoff = min(max(2 * backoff, 1e-3), poll_interval)
+                    time.sleep(backoff)
+
+        loops = _NodeLoops(
+            redis_api, list(streams), node_loop, True, observer, _scheduler
+        )
+        loops.start()
+        return Disposable(loops.dispose)
+
+    return Observable(subscribe)
+
 
 def from_stream(
-    redis_api: Redis,
+    redis_api: Union[Redis, RedisCluster],
     stream: str,
     stream_id: str = "$",
     batch: int = 1,
@@ -25,7 +297,7 @@ def from_stream(
     """Turns a Redis stream into an observable sequence.
 
     Params:
-        redis_api: Redis client
+        redis_api: Redis or RedisCluster client
         stream: Redis stream name
         stream_id: Stream id to be considered last read. Special tokens are '$' and '>',
             with '>' setting stream id to last available at point of subscription.
@@ -43,57 +315,150 @@ def from_stream(
         Each element is a tuple of stream-id and value dict: StreamDataWithId.
     """
 
+    return _read_streams(
+        redis_api,
+        {stream: stream_id},
+        batch,
+        timeout,
+        complete_on_timeout,
+        latest,
+        0.0,
+        scheduler,
+    ).pipe(ops.map(lambda x: x[1]))
+
+
+def from_streams(
+    redis_api: Union[Redis, RedisCluster],
+    streams: Union[str, list[str], dict[str, str]],
+    stream_id: str = "$",
+    batch: int = 1,
+    timeout: float = 0.5,
+    complete_on_timeout: bool = False,
+    latest: bool = False,
+    poll_interval: float = 0.05,
+    scheduler: Optional[abc.SchedulerBase] = None,
+) -> Observable[NamedStreamDataWithId]:
+    """Turns multiple Redis streams into a single observable sequence.
+
+    Streams are read by one loop per node, a single loop on a plain Redis
+    client. Since XREAD requires all its keys to share a hash slot, a node
+    serving streams of a single slot blocks on XREAD, while a node serving
+    multiple slots polls them in one pipelined round trip, backing off up to
+    `poll_interval` when idle. Use hash tags, e.g. `{sensors}.s1` and
+    `{sensors}.s2`, to get blocking reads.
+
+    On a Redis Cluster, MOVED/ASK redirections, CLUSTERDOWN/TRYAGAIN and
+    connection errors are taken as a change of the slot layout. The slot map is
+    then refreshed and all read loops are restarted from the last seen ids.
+
+    Params:
+        redis_api: Redis or RedisCluster client
+        streams: Redis stream names, or mapping of stream name to start stream id.
+        stream_id: Start stream id for streams given without one. Special tokens are
+            '$' and '>', both setting stream id to last available at point of
+            subscription.
+        batch: batch size per call and stream.
+        timeout: Timeout in seconds
+        complete_on_timeout: When true, a read loop completes once no elements within
+            timeout period can be read. The observable completes when all read
+            loops have completed.
+        latest: When true and batch-size greater than one will emit only the latest
+            item of batch per stream and ignore the rest.
+        poll_interval: Max time in seconds between polls of nodes serving multiple
+            hash slots.
+        scheduler: Scheduler instance to schedule the read loops on. When reading
+            from a cluster and no scheduler is given, each read loop runs on its own
+            thread. A given scheduler must run actions concurrently, e.g. a
+            ThreadPoolScheduler with at least one worker per node, as read loops
+            only return on completion.
+
+    Returns:
+        The observable sequence whose elements are pulled from the given Redis
+        streams. Each element is a tuple of stream name and stream element:
+        NamedStreamDataWithId.
+    """
+
+    if isinstance(streams, str):
+        streams = [streams]
+    if not isinstance(streams, dict):
+        streams = {s: stream_id for s in streams}
+
+    return _read_streams(
+        redis_api,
+        streams,
+        batch,
+        timeout,
+        complete_on_timeout,
+        latest,
+        poll_interval,
+        scheduler,
+    )
+
+
+def _listen(
+    redis_api: Union[Redis, RedisCluster],
+    channels: list[str],
+    subscribe_: Callable[..., Any],
+    unsubscribe_: Callable[..., Any],
+    sharded: bool,
+    timeout: float,
+    complete_on_timeout: bool,
+    scheduler: Optional[abc.SchedulerBase],
+) -> Observable[PubSubDataWithId]:
+    """Listens to PubSub events with one loop per node when sharded.
+
+    `subscribe_` and `unsubscribe_` are the PubSub methods to (un)subscribe
+    channels with, e.g. `PubSub.psubscribe` and `PubSub.punsubscribe`.
+    """
+
     def subscribe(
-        observer: abc.ObserverBase[StreamDataWithId],
+        observer: abc.ObserverBase[PubSubDataWithId],
         scheduler_: Optional[abc.SchedulerBase] = None,
     ) -> abc.DisposableBase:
-        nonlocal stream_id
-        _scheduler = scheduler or scheduler_ or CurrentThreadScheduler.singleton()
-        disposed = False
-
-        sid = stream_id
-        if sid == ">":
-            # Handle start with next entry after join (best-effort)
-            try:
-                resp = redis_api.xinfo_stream(stream)
-                sid = resp["last-entry"][0]
-            except redis.ResponseError:
-                # Stream not available
-                sid = "0"
+        cluster = sharded and isinstance(redis_api, RedisCluster)
+        _scheduler = (
+            scheduler
+            or scheduler_
+            or (NewThreadScheduler() if cluster else CurrentThreadScheduler.singleton())
+        )
 
-        def from_stream_impl(_: abc.SchedulerBase, __: Any = None) -> None:
-            nonlocal disposed, sid
+        def node_loop(
+            client: Redis,
+            keys: list[str],
+            active: Callable[[], bool],
+            emit: Callable,
+        ) -> None:
+            pubsub = client.pubsub()
 
             try:
-                while not disposed:
-                    resp = redis_api.xread(
-                        {stream: sid}, count=batch, block=int(timeout * 1e3)
-                    )
-                    if len(resp) == 0:
+                subscribe_(pubsub, *keys)
+                while active():
+                    resp = pubsub.get_message(timeout=timeout)
+                    if resp is None:
                         # Handle timeout behavior
                         if complete_on_timeout:
-                            observer.on_completed()
-                    else:
-                        # Handle data
-                        resp = resp[0][1]  # one stream only
-                        if latest:
-                            resp = resp[-1:]  # latest item only
-                        for rid, value in resp:
-                            observer.on_next((rid, value))
-
-                        # Update last seen
-                        if len(resp) > 0:
-                            sid = resp[-1][0]
-            except Exception as error:  # pylint: disable=broad-except
-                # Handle error
-                observer.on_error(error)
+                            return
+                    elif resp["type"] in PubSub.PUBLISH_MESSAGE_TYPES:
+                        # Handle data, add redis-timestamp
+                        t = client.time()
+                        tc = str(int(round(t[0] * 1e3 + t[1] * 1e-3)))
+                        data = {"channel": resp["channel"], "message": resp["data"]}
 
-        def dispose() -> None:
-            nonlocal disposed
-            disposed = True
+                        emit(lambda: observer.on_next((tc, data)))
+                    elif resp["type"] == "sunsubscribe":
+                        # Server-side unsubscribe, shard channel slot migrated
+                        raise _SlotMigratedError(resp["channel"])
+            finally:
+                try:
+                    unsubscribe_(pubsub, *keys)
+                finally:
+                    pubsub.close()
 
-        disp = Disposable(dispose)
-        return CompositeDisposable(_scheduler.schedule(from_stream_impl), disp)
+        loops = _NodeLoops(
+            redis_api, channels, node_loop, sharded, observer, _scheduler
+        )
+        loops.start()
+        return Disposable(loops.dispose)
 
     return Observable(subscribe)
 
@@ -124,48 +489,70 @@ def on_publish(
     if isinstance(pattern, str):
         pattern = [pattern]
 
-    def subscribe(
-        observer: abc.ObserverBase[PubSubDataWithId],
-        scheduler_: Optional[abc.SchedulerBase] = None,
-    ) -> abc.DisposableBase:
-        _scheduler = scheduler or scheduler_ or CurrentThreadScheduler.singleton()
-        disposed = False
+    return _listen(
+        redis_api,
+        pattern,
+        PubSub.psubscribe,
+        PubSub.punsubscribe,
+        False,
+        timeout,
+        complete_on_timeout,
+        scheduler,
+    )
 
-        def from_stream_impl(_: abc.SchedulerBase, __: Any = None) -> None:
-            nonlocal disposed
-            pubsub = redis_api.pubsub(ignore_subscribe_messages=True)
-            pubsub.psubscribe(*pattern)
 
-            try:
-                while not disposed:
-                    resp = pubsub.get_message(timeout=timeout)
-                    if resp is None:
-                        # Handle timeout behavior
-                        if complete_on_timeout:
-                            observer.on_completed()
-                    else:
-                        # Handle data, add redis-timestamp
-                        t = redis_api.time()
-                        tc = str(int(round(t[0] * 1e3 + t[1] * 1e-3)))
+def on_spublish(
+    redis_api: Union[Redis, RedisCluster],
+    channels: Union[str, list[str]],
+    timeout: float = 0.5,
+    complete_on_timeout: bool = False,
+    scheduler: Optional[abc.SchedulerBase] = None,
+) -> Observable[PubSubDataWithId]:
+    """An observable that fires when Redis sharded PubSub events are received.
 
-                        observer.on_next(
-                            (tc, {"channel": resp["channel"], "message": resp["data"]})
-                        )
-            except Exception as error:  # pylint: disable=broad-except
-                # Handle error
-                observer.on_error(error)
-            finally:
-                pubsub.punsubscribe(*pattern)
-                pubsub.close()
+    In contrast to `on_publish`, messages are only propagated within the shard
+    owning the channel's hash slot instead of being broadcast to every node of
+    a cluster. On a Redis Cluster channels are grouped by node and one listen
+    loop is run per node. Requires Redis >= 7.0.
 
-        def dispose() -> None:
-            nonlocal disposed
-            disposed = True
+    When a node drops shard channels due to slot migration, or on MOVED
+    redirections, CLUSTERDOWN and connection errors, the slot map is refreshed
+    and all listen loops are resubscribed on the new layout. Messages published
+    in between are lost, as usual for PubSub.
 
-        disp = Disposable(dispose)
-        return CompositeDisposable(_scheduler.schedule(from_stream_impl), disp)
+    Params:
+        redis_api: Redis or RedisCluster client
+        channels: Shard channels to subscribe to. See `ssubscribe`. Patterns are
+            not supported.
+        timeout: Timeout in seconds
+        complete_on_timeout: When true, a listen loop completes once no elements
+            within timeout period can be read. The observable completes when all
+            listen loops have completed.
+        scheduler: Scheduler instance to schedule the listen loops on. When
+            listening on a cluster and no scheduler is given, each listen loop runs
+            on its own thread. A given scheduler must run actions concurrently, e.g.
+            a ThreadPoolScheduler with at least one worker per node, as listen loops
+            only return on completion.
 
-    return Observable(subscribe)
+    Returns:
+        The observable sequence of Redis sharded PubSub events. Each notification
+        is composed of (Id, Dict) where Dict contains 'channel' and 'message'
+        information.
+    """
+
+    if isinstance(channels, str):
+        channels = [channels]
+
+    return _listen(
+        redis_api,
+        channels,
+        PubSub.ssubscribe,
+        PubSub.sunsubscribe,
+        True,
+        timeout,
+        complete_on_timeout,
+        scheduler,
+    )
 
 
 def on_keyspace(redis_api: Redis, keys: Union[str, list[str]]):
@@ -206,4 +593,4 @@ def on_keyspace(redis_api: Redis, keys: Union[str, list[str]]):
     )
 
 
-__all__ = ["from_stream", "on_publish", "on_keyspace"]
+__all__ = ["from_stream", "from_streams", "on_publish", "on_spublish", "on_keyspace"]
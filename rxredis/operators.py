@@ -6,6 +6,7 @@ from reactivex import abc
 from redis import Redis
 
 from .observables import StreamDataWithId
+from .tracing import LatencyTracker, origin_ms, with_context
 
 MapStr = Callable[[StreamDataWithId], str]
 StrOrMapStr = Union[str, MapStr]
@@ -16,6 +17,8 @@ def to_stream(
     stream: StrOrMapStr,
     relay_streamid: bool = False,
     max_len: int = 500,
+    tracker: Optional[LatencyTracker] = None,
+    trace_stage: str = "write",
 ) -> Callable[[Observable[StreamDataWithId]], Observable[StreamDataWithId]]:
     """The push to stream operator.
 
@@ -29,6 +32,10 @@ def to_stream(
         relay_streamid: When true, the Redis stream id is copied from the input. When false,
             '*' is used to auto-generate an id upon insertion.
         max_len: Max stream length in Redis
+        tracker: When given, a trace context is carried in the reserved field
+            `tracing.TRACE_FIELD` of the pushed element and its age after the
+            write is recorded.
+        trace_stage: Stage name under which ages are recorded in tracker.
 
     Returns:
         A partially applied operator that takes an observable source and returns an
@@ -45,10 +52,18 @@ def to_stream(
             def on_next(x: StreamDataWithId) -> None:
                 xstream = stream if isinstance(stream, str) else stream(x)
                 xid = x[0] if relay_streamid else "*"
+                traced = x if tracker is None else with_context(x)
                 try:
-                    redis_api.xadd(name=xstream, fields=x[1], id=xid, maxlen=max_len)
+                    redis_api.xadd(
+                        name=xstream, fields=traced[1], id=xid, maxlen=max_len
+                    )
                 except Exception as e:
                     observer.on_error(e)
+                    return
+                if tracker is not None:
+                    origin = origin_ms(traced)
+                    if origin is not None:
+                        tracker.record(trace_stage, origin)
                 observer.on_next(x)
 
             return source.subscribe(
@@ -60,4 +75,47 @@ def to_stream(
     return to_xstream_impl
 
 
-__all__ = ["to_stream"]
+def trace(
+    tracker: LatencyTracker,
+    stage: str,
+) -> Callable[[Observable[StreamDataWithId]], Observable[StreamDataWithId]]:
+    """The latency tracing operator.
+
+    Records the age of each element at the given stage and emits the element
+    unchanged. The age is measured relative to the origin time found in the
+    element's trace context or, if absent, encoded in its stream id. Elements
+    without either (e.g. id '*') are not recorded, so transforms should keep
+    the stream id or the trace field to remain traceable.
+
+    Params:
+        tracker: Latency tracker aggregating the ages
+        stage: Stage name under which ages are recorded
+
+    Returns:
+        A partially applied operator that takes an observable source and returns an
+        observable sequence with identical elements.
+    """
+
+    def trace_impl(
+        source: Observable[StreamDataWithId],
+    ) -> Observable[StreamDataWithId]:
+        def subscribe(
+            observer: abc.ObserverBase[StreamDataWithId],
+            scheduler: Optional[abc.SchedulerBase] = None,
+        ) -> abc.DisposableBase:
+            def on_next(x: StreamDataWithId) -> None:
+                origin = origin_ms(x)
+                if origin is not None:
+                    tracker.record(stage, origin)
+                observer.on_next(x)
+
+            return source.subscribe(
+                on_next, observer.on_error, observer.on_completed, scheduler=scheduler
+            )
+
+        return Observable(subscribe)
+
+    return trace_impl
+
+
+__all__ = ["to_stream", "trace"]
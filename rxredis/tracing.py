@@ -0,0 +1,147 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional, Union
+
+TRACE_FIELD = "_trace"
+"""Reserved stream field carrying the trace context across stream hops."""
+
+
+def encode_context(origin_ms: int, hops: int = 0) -> str:
+    """Returns the compact trace context string `<origin_ms>:<hops>`.
+
+        >>> encode_context(1701423882967, 2)
+        '1701423882967:2'
+    """
+    return f"{origin_ms}:{hops}"
+
+
+def decode_context(ctx: Union[str, bytes]) -> tuple[int, int]:
+    """Returns (origin_ms, hops) of a trace context string.
+
+        >>> decode_context("1701423882967:2")
+        (1701423882967, 2)
+    """
+    if isinstance(ctx, bytes):
+        ctx = ctx.decode()
+    origin, _, hops = ctx.partition(":")
+    return int(origin), int(hops or 0)
+
+
+def _context_key(fields: dict) -> Optional[Union[str, bytes]]:
+    """Returns the trace field key present in fields, str or bytes, or None."""
+    if TRACE_FIELD in fields:
+        return TRACE_FIELD
+    if TRACE_FIELD.encode() in fields:
+        return TRACE_FIELD.encode()
+    return None
+
+
+def _id_origin_ms(sid: Union[str, bytes]) -> Optional[int]:
+    """Returns the millisecond part of a stream id or None for e.g. '*'."""
+    if isinstance(sid, bytes):
+        sid = sid.decode()
+    ms = sid.split("-")[0]
+    return int(ms) if ms.isdigit() else None
+
+
+def origin_ms(x: tuple[str, dict]) -> Optional[int]:
+    """Returns the origin Redis time in milliseconds of a stream element.
+
+    The origin is taken from the trace context if present, otherwise from the
+    millisecond part of the stream id. Returns None for elements with an
+    unparsable context and for elements without context that have not been
+    written to a stream yet (i.e. id '*').
+    """
+    key = _context_key(x[1])
+    if key is not None:
+        try:
+            return decode_context(x[1][key])[0]
+        except ValueError:
+            return None
+    return _id_origin_ms(x[0])
+
+
+def with_context(x: tuple[str, dict]) -> tuple[str, dict]:
+    """Returns element with trace context attached for the next stream hop.
+
+    An existing context has its hop count incremented. Otherwise, or if the
+    existing context is unparsable, a new context is started from the element's
+    stream id. Elements without origin are returned unchanged.
+    """
+    key = _context_key(x[1])
+    try:
+        origin, hops = decode_context(x[1][key])
+    except (KeyError, ValueError):
+        key = key or TRACE_FIELD
+        origin, hops = _id_origin_ms(x[0]), 0
+        if origin is None:
+            return x
+    return (x[0], {**x[1], key: encode_context(origin, hops + 1)})
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted, non-empty samples."""
+    idx = math.ceil(q * len(samples)) - 1
+    return samples[min(max(idx, 0), len(samples) - 1)]
+
+
+class LatencyTracker:
+    """Aggregates per-stage element ages into rolling latency windows.
+
+    Ages are measured in milliseconds against the local wall clock, so client
+    and Redis server clocks are assumed to be in sync.
+
+    Params:
+        window: Number of most recent samples kept per stage.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self.window = window
+        self._samples: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, origin: int) -> float:
+        """Records the age of an element with given origin time at stage."""
+        age = time.time() * 1e3 - origin
+        with self._lock:
+            self._samples[stage].append(age)
+        return age
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        """Returns the q-th (0..1) percentile age of stage or None if empty."""
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) == 0:
+            return None
+        return _percentile(samples, q)
+
+    def summary(
+        self, quantiles: tuple[float, ...] = (0.5, 0.99)
+    ) -> dict[str, dict[str, float]]:
+        """Returns count and percentile ages in milliseconds of all stages.
+
+            >>> tracker.summary()
+            {'read': {'count': 6, 'p50': 1.2, 'p99': 3.4}, ...}
+        """
+        with self._lock:
+            stages = {k: sorted(v) for k, v in self._samples.items()}
+        result = {}
+        for stage, samples in stages.items():
+            result[stage] = {"count": len(samples)}
+            for q in quantiles:
+                result[stage][f"p{q * 100:g}"] = _percentile(samples, q)
+        return result
+
+
+__all__ = [
+    "TRACE_FIELD",
+    "encode_context",
+    "decode_context",
+    "origin_ms",
+    "with_context",
+    "LatencyTracker",
+]